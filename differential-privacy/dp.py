@@ -1,17 +1,27 @@
+import os
+import sys
 import warnings
 from typing import Tuple, List, Optional
 
 import pandas as pd
 import numpy as np
+import matplotlib
+
+# Headless when scripted (CI, pipes, worker processes): skip interactive backend start-up.
+# sys.stdout is None under pythonw and similar launchers.
+if os.environ.get("MPLBACKEND") is None and (sys.stdout is None or not sys.stdout.isatty()):
+    matplotlib.use("Agg")
+
 import matplotlib.pyplot as plt
 import diffprivlib
 import diffprivlib.models as dp_models
+from joblib import Parallel, delayed
 
 from sklearn.preprocessing import OneHotEncoder
 from sklearn.model_selection import train_test_split
 from sklearn.compose import ColumnTransformer
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics import classification_report
+from sklearn.metrics import f1_score
 
 
 class DPKet:
@@ -20,91 +30,168 @@ class DPKet:
     Unified interface for Statistical Analysis and Machine Learning.
     """
 
-    def __init__(self, data_path: str):
+    # Call plt.show() after each plot; set False to only get the returned Figure
+    show = True
+
+    def __init__(self, data_path: str, seed: Optional[int] = None):
         """
         Loads the dataset and performs initial cleaning.
+        A `seed` makes every noise draw (NumPy and diffprivlib) reproducible.
         """
         self.raw_df = pd.read_csv(data_path)
 
+        # Single PCG64 generator shared by all vectorized mechanisms
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+
         # Pre-clean data: Drop missing Age values (critical for both Stats and ML)
         self.clean_df = self.raw_df.dropna(subset=["Age"])
 
+        # Encoded train/test splits, keyed by (target_col, features)
+        self._ml_cache = {}
+
         # Suppress specific privacy budget warnings for cleaner output
         warnings.simplefilter("ignore")
 
+    def _random_state(self) -> Optional[int]:
+        """
+        Seed for a diffprivlib call, drawn from self.rng.
+        diffprivlib only accepts RandomState-style seeds, not a Generator.
+        """
+        return None if self.seed is None else int(self.rng.integers(2 ** 32))
+
     # =========================================================================
     #  SECTION 1: STATISTICAL ANALYSIS
     # =========================================================================
 
-    def analyze_mean_stability(self, column: str, epsilons: List[float], bounds: Tuple[float, float]):
+    def analyze_mean_stability(self, column: str, epsilons: List[float], bounds: Tuple[float, float],
+                               use_reference: bool = False):
         """
         Calculates and plots the difference between Real Mean and DP Mean
         across varying privacy budgets (epsilon).
+        The column is clipped and summed once, then one Laplace sample per epsilon
+        is drawn in a single call. Set `use_reference=True` to call diffprivlib
+        once per epsilon instead (useful for regression checks).
         """
         real_mean = self.clean_df[column].mean()
 
-        # Calculate DP Mean for each epsilon
-        dp_means = []
-        for eps in epsilons:
+        if use_reference:
             # diffprivlib requires bounds (min, max) to calibrate noise
-            res = diffprivlib.tools.mean(self.clean_df[column], epsilon=eps, bounds=bounds)
-            dp_means.append(res)
-
-        self._plot_stability_curve(column, epsilons, real_mean, dp_means)
-
-    def compare_histograms(self, column: str, epsilon: float, bins: List[int], bounds: Tuple[float, float]):
+            dp_means = [diffprivlib.tools.mean(self.clean_df[column], epsilon=eps, bounds=bounds,
+                                               random_state=self._random_state())
+                        for eps in epsilons]
+        else:
+            # Laplace Mechanism: Sensitivity of the mean = (max - min) / n
+            col = np.clip(self.clean_df[column].to_numpy(dtype=np.float64), *bounds)
+            n = col.size
+            sensitivity = (bounds[1] - bounds[0]) / n
+            scales = sensitivity / np.asarray(epsilons, dtype=np.float64)
+            dp_means = col.sum() / n + self.rng.laplace(0.0, scales)
+
+        return self._plot_stability_curve(column, epsilons, real_mean, dp_means)
+
+    def compare_histograms(self, column: str, epsilon: float, bins: List[int], bounds: Tuple[float, float],
+                           strict: bool = False):
         """
         Visualizes the distortion added by Differential Privacy to a histogram.
+        The DP counts reuse the original histogram plus per-bin Laplace noise;
+        set `strict=True` to compute them with diffprivlib instead.
         """
         # 1. Calculate Original Histogram
-        clean_col = self.clean_df[column]
-        hist_orig, bin_edges = np.histogram(clean_col, bins=bins)
+        clean_col = self.clean_df[column].to_numpy()
+        hist_orig, bin_edges = np.histogram(clean_col, bins=bins, range=bounds)
 
         # 2. Calculate DP Histogram
-        hist_dp, _ = diffprivlib.tools.histogram(
-            clean_col, epsilon=epsilon, bins=bins, range=bounds
-        )
-
-        self._plot_histogram_comparison(hist_orig, hist_dp, bin_edges, epsilon)
-
-    def calculate_private_sum(self, column: str, epsilon: float) -> float:
+        if strict:
+            hist_dp, _ = diffprivlib.tools.histogram(
+                clean_col, epsilon=epsilon, bins=bins, range=bounds, random_state=self._random_state()
+            )
+        else:
+            # Laplace Mechanism: Sensitivity of each count = 1 (add/remove one row)
+            noise = self.rng.laplace(0.0, 1.0 / epsilon, size=hist_orig.shape)
+            hist_dp = np.rint(np.maximum(hist_orig + noise, 0)).astype(np.int64)
+
+        return self._plot_histogram_comparison(hist_orig, hist_dp, bin_edges, epsilon)
+
+    def calculate_private_sum(self, column: str, epsilon: float,
+                              bounds: Optional[Tuple[float, float]] = None) -> float:
         """
         Calculates a differentially private sum using the Laplace Mechanism.
-        Automatically detects bounds from the dataset (Note: In real scenarios, bounds should be known a priori).
+        If `bounds` is omitted they are detected from the dataset (Note: In real scenarios, bounds should be known a priori).
         """
+        col = self.raw_df[column].to_numpy(dtype=np.float64)
+
         # Bounds are required for sensitivity (Sensitivity = max_value - min_value)
         # We assume min is 0 for financial data like 'Fare'
-        max_val = self.raw_df[column].max()
+        if bounds is None:
+            low, high = 0.0, float(col.max())
+        else:
+            low, high = bounds
 
-        dp_sum = diffprivlib.tools.sum(
-            self.raw_df[column],
-            epsilon=epsilon,
-            bounds=(0, max_val)
-        )
-        return dp_sum
+        # Not clipped in place: to_numpy() may return a view of raw_df
+        clipped_sum = np.clip(col, low, high).sum()
+        return clipped_sum + self.rng.laplace(0.0, (high - low) / epsilon)
+
+    def sweep(self, column: str, epsilons: List[float], bounds: Tuple[float, float], bins: List[int]) -> Tuple:
+        """
+        DP mean, sum and histogram of a column for every epsilon in one pass.
+        The column is clipped, summed and binned once, and all noise comes from a
+        single Laplace draw. Each epsilon is spent on each statistic separately.
+        Returns (dp_means, dp_sums, dp_hists, bin_edges) with one row per epsilon in dp_hists.
+        """
+        col = np.clip(self.clean_df[column].to_numpy(dtype=np.float64), *bounds)
+        n = col.size
+        true_sum = col.sum()
+        hist, bin_edges = np.histogram(col, bins=bins, range=bounds)
+
+        # Laplace Mechanism: Sensitivity of [mean, sum, bin_0, ..., bin_m]
+        width = bounds[1] - bounds[0]
+        sensitivity = np.concatenate([[width / n, width], np.ones(hist.size)])
+
+        # Unit noise for every (epsilon, statistic) pair in one draw, then scaled
+        eps = np.asarray(epsilons, dtype=np.float64)
+        unit = self.rng.laplace(0.0, 1.0, size=(eps.size, sensitivity.size))
+        noise = unit * (sensitivity[None, :] / eps[:, None])
+
+        dp_means = true_sum / n + noise[:, 0]
+        dp_sums = true_sum + noise[:, 1]
+        dp_hists = np.rint(np.maximum(hist[None, :] + noise[:, 2:], 0)).astype(np.int64)
+        return dp_means, dp_sums, dp_hists, bin_edges
 
     # =========================================================================
     #  SECTION 2: MACHINE LEARNING (DP Random Forest)
     # =========================================================================
 
-    def _prepare_ml_data(self, target_col: str) -> Tuple:
+    def _prepare_ml_data(self, target_col: str, features: Optional[List[str]] = None) -> Tuple:
         """
         Internal helper to preprocess data: Select features, OneHotEncode, and Split.
+        The split is deterministic, so it is computed once per (target, features) and cached.
         """
         # Define features as per original script
-        features = ["Sex", "Age", "SibSp", "Parch", "Fare", "Embarked", "Deck"]
-
-        X = self.clean_df[features].values
-        y = self.clean_df[target_col].values
-
-        # Apply Encoding: Columns 0 (Sex), 5 (Embarked), 6 (Deck)
-        preprocessor = ColumnTransformer(
-            [("OneHot", OneHotEncoder(handle_unknown='ignore'), [0, 5, 6])],
-            remainder="passthrough"
-        )
-
-        X_encoded = preprocessor.fit_transform(X)
-        return train_test_split(X_encoded, y, test_size=0.33, random_state=42)
+        if features is None:
+            features = ["Sex", "Age", "SibSp", "Parch", "Fare", "Embarked", "Deck"]
+
+        key = (target_col, tuple(features))
+        if key not in self._ml_cache:
+            X = self.clean_df[features].values
+            y = self.clean_df[target_col].values
+
+            # Apply Encoding to the non-numeric columns (default: 0 Sex, 5 Embarked, 6 Deck)
+            categorical = [i for i, f in enumerate(features)
+                           if not pd.api.types.is_numeric_dtype(self.clean_df[f])]
+            preprocessor = ColumnTransformer(
+                [("OneHot", OneHotEncoder(handle_unknown='ignore', sparse_output=False, dtype=np.float32),
+                  categorical)],
+                remainder="passthrough"
+            )
+
+            # Dense float32: diffprivlib's forest rejects sparse input, and the
+            # passthrough columns would otherwise keep the matrix as object dtype
+            X_encoded = preprocessor.fit_transform(X).astype(np.float32)
+            self._ml_cache[key] = tuple(
+                train_test_split(X_encoded, y, test_size=0.33, random_state=42, stratify=y)
+            )
+        return self._ml_cache[key]
 
     def evaluate_ml_tradeoff(self, target_col: str, epsilons: List[float]):
         """
@@ -114,51 +201,76 @@ class DPKet:
         X_train, X_test, y_train, y_test = self._prepare_ml_data(target_col)
 
         # 1. Baseline (Non-Private) Model
-        baseline_rf = RandomForestClassifier(n_estimators=10, random_state=42)
+        baseline_rf = RandomForestClassifier(n_estimators=10, random_state=42, n_jobs=-1)
         baseline_rf.fit(X_train, y_train)
         baseline_pred = baseline_rf.predict(X_test)
 
         # Extract macro avg F1 score
-        baseline_f1 = classification_report(y_test, baseline_pred, output_dict=True)['macro avg']['f1-score']
-
-        # 2. DP Models Loop
-        dp_scores = []
-        print(f"\n--- Training DP Models (Target: {target_col}) ---")
-
-        for eps in epsilons:
-            # DP Random Forest
-            dp_clf = dp_models.RandomForestClassifier(n_estimators=10, epsilon=eps)
+        baseline_f1 = f1_score(y_test, baseline_pred, average='macro', zero_division=0)
+
+        # 2. DP Models Sweep
+        # Each epsilon is an independent fit, so the sweep runs across processes;
+        # seeds are drawn up front so results do not depend on worker scheduling.
+        # The arrays are passed as arguments (not closed over) so joblib can
+        # memory-map large ones into the workers instead of pickling copies.
+        def _fit_score(eps, random_state, X_train, y_train, X_test, y_test):
+            dp_clf = dp_models.RandomForestClassifier(n_estimators=10, epsilon=eps, n_jobs=-1,
+                                                      random_state=random_state)
             dp_clf.fit(X_train, y_train)
 
             dp_pred = dp_clf.predict(X_test)
-            score = classification_report(y_test, dp_pred, output_dict=True)['macro avg']['f1-score']
-            dp_scores.append(score)
+            return f1_score(y_test, dp_pred, average='macro', zero_division=0)
+
+        print(f"\n--- Training DP Models (Target: {target_col}) ---")
+        seeds = [self._random_state() for _ in epsilons]
+        dp_scores = Parallel(n_jobs=-1, backend='loky', mmap_mode='r')(
+            delayed(_fit_score)(eps, seed, X_train, y_train, X_test, y_test)
+            for eps, seed in zip(epsilons, seeds)
+        )
+
+        for eps, score in zip(epsilons, dp_scores):
             print(f"  > Epsilon: {eps:<5} | F1-Score: {score:.4f}")
 
-        self._plot_ml_tradeoff(epsilons, baseline_f1, dp_scores)
+        return self._plot_ml_tradeoff(epsilons, baseline_f1, dp_scores)
 
     # =========================================================================
     #  SECTION 3: VISUALIZATION HELPERS (Private Methods)
     # =========================================================================
 
-    def _plot_stability_curve(self, col, epsilons, real_val, dp_vals):
-        plt.figure(figsize=(7, 5))
-        plt.plot(epsilons, [real_val] * len(epsilons), '--', color='grey', label='True Mean')
-        plt.plot(epsilons, dp_vals, marker='o', color='tab:blue', label='DP Mean')
-        plt.xscale('log')
-        plt.xlabel('Privacy Budget (Epsilon)')
-        plt.ylabel(f'Mean {col}')
-        plt.title(f'Statistical Accuracy vs Privacy ({col})')
-        plt.legend()
-        plt.grid(True, alpha=0.3)
-        plt.show()
-
-    def _plot_histogram_comparison(self, h_orig, h_dp, bins, eps):
+    def _new_axes(self, ax, figsize):
+        """Returns (fig, ax, owned): a fresh figure is created only when no axes are given."""
+        if ax is not None:
+            return ax.figure, ax, False
+        fig, ax = plt.subplots(figsize=figsize)
+        return fig, ax, True
+
+    def _finish(self, fig, owned):
+        # Figures created here are released from pyplot once shown, so repeated
+        # calls do not accumulate open figures; the returned Figure stays usable
+        if owned:
+            if self.show:
+                plt.show()
+            plt.close(fig)
+        return fig
+
+    def _plot_stability_curve(self, col, epsilons, real_val, dp_vals, ax: Optional[plt.Axes] = None):
+        fig, ax, owned = self._new_axes(ax, figsize=(7, 5))
+        ax.plot(epsilons, [real_val] * len(epsilons), '--', color='grey', label='True Mean')
+        ax.plot(epsilons, dp_vals, marker='o', color='tab:blue', label='DP Mean')
+        ax.set_xscale('log')
+        ax.set_xlabel('Privacy Budget (Epsilon)')
+        ax.set_ylabel(f'Mean {col}')
+        ax.set_title(f'Statistical Accuracy vs Privacy ({col})')
+        ax.legend()
+        ax.grid(True, alpha=0.3)
+        return self._finish(fig, owned)
+
+    def _plot_histogram_comparison(self, h_orig, h_dp, bins, eps, ax: Optional[plt.Axes] = None):
         labels = [f"{int(bins[i])}-{int(bins[i + 1])}" for i in range(len(bins) - 1)]
         x = np.arange(len(labels))
         width = 0.35
 
-        fig, ax = plt.subplots(figsize=(8, 5))
+        fig, ax, owned = self._new_axes(ax, figsize=(8, 5))
         ax.bar(x - width / 2, h_orig, width, label='Original', color='skyblue')
         ax.bar(x + width / 2, h_dp, width, label=f'DP (ε={eps})', color='salmon')
 
@@ -167,21 +279,22 @@ class DPKet:
         ax.set_xticks(x)
         ax.set_xticklabels(labels, rotation=45)
         ax.legend()
-        plt.tight_layout()
-        plt.show()
-
-    def _plot_ml_tradeoff(self, epsilons, baseline, scores):
-        plt.figure(figsize=(7, 5))
-        plt.plot(epsilons, [baseline] * len(epsilons), '--', color='black', label="Standard RF")
-        plt.plot(epsilons, scores, marker='o', color='purple', label="Private RF")
-        plt.xscale('log')
-        plt.xlabel('Epsilon (log scale)')
-        plt.ylabel('F1-Score')
-        plt.title('Machine Learning Utility vs Privacy')
-        plt.ylim(0, 1.0)
-        plt.legend()
-        plt.grid(True, alpha=0.3)
-        plt.show()
+        if owned:
+            fig.tight_layout()
+        return self._finish(fig, owned)
+
+    def _plot_ml_tradeoff(self, epsilons, baseline, scores, ax: Optional[plt.Axes] = None):
+        fig, ax, owned = self._new_axes(ax, figsize=(7, 5))
+        ax.plot(epsilons, [baseline] * len(epsilons), '--', color='black', label="Standard RF")
+        ax.plot(epsilons, scores, marker='o', color='purple', label="Private RF")
+        ax.set_xscale('log')
+        ax.set_xlabel('Epsilon (log scale)')
+        ax.set_ylabel('F1-Score')
+        ax.set_title('Machine Learning Utility vs Privacy')
+        ax.set_ylim(0, 1.0)
+        ax.legend()
+        ax.grid(True, alpha=0.3)
+        return self._finish(fig, owned)
 
 
 # =========================================================================
@@ -192,29 +305,44 @@ if __name__ == "__main__":
     # Initialize Toolkit
     toolkit = DPKet("data/titanic.csv")
 
+    # On a non-interactive backend plt.show() is a no-op: save the figures instead
+    headless = plt.get_backend().lower() in {"agg", "pdf", "ps", "svg", "pgf", "cairo", "template"}
+    if headless:
+        toolkit.show = False
+        os.makedirs("plots", exist_ok=True)
+
+    def save(fig, name):
+        if headless:
+            path = os.path.join("plots", name)
+            fig.savefig(path)
+            print(f"Saved plot to '{path}'")
+
     print("1. Running Statistical Stability Check...")
     # Analyze how the mean of 'Age' changes with epsilon
-    toolkit.analyze_mean_stability(
+    fig = toolkit.analyze_mean_stability(
         column="Age",
         epsilons=[0.01, 0.05, 0.1, 0.5, 1.0, 5.0],
         bounds=(0, 80)
     )
+    save(fig, "stat_utility_privacy.png")
 
     print("\n2. Comparing Histograms...")
     # Visualize histogram noise
-    toolkit.compare_histograms(
+    fig = toolkit.compare_histograms(
         column="Age",
         epsilon=0.1,
         bins=[0, 10, 20, 30, 40, 50, 60, 70, 80],
         bounds=(0, 80)
     )
+    save(fig, "comparison.png")
 
     print("\n3. Evaluating ML Privacy Trade-off...")
     # Compare Random Forest performance
-    toolkit.evaluate_ml_tradeoff(
+    fig = toolkit.evaluate_ml_tradeoff(
         target_col="Survived",
         epsilons=[0.01, 0.1, 0.5, 1.0, 5.0, 10.0]
     )
+    save(fig, "ml_utility_privacy.png")
 
     print("\n4. Calculating Private Sum...")
     real_fare = toolkit.raw_df['Fare'].sum()
@@ -1,33 +1,33 @@
+import colorsys
+import numpy as np
 import pandas as pd
-import hashlib
+from openpyxl import load_workbook
+from openpyxl.styles import PatternFill
 from src.mondrian import MondrianAnonymizer
 
 
-def generate_color(val):
+def build_palette(partition_ids):
     """
-    Generates a hex color code based on the partition ID.
-    Returns a CSS-like string 'background-color: #RRGGBB'
+    Assigns a color to each partition ID, spacing hues by the golden ratio.
+    Returns a dict {partition_id: 'RRGGBB'}
     """
-    if pd.isna(val):
-        return ''
-    hash_object = hashlib.md5(str(val).encode())
-    hex_color = hash_object.hexdigest()[:6]
-    return f'background-color: #{hex_color}'
+    palette = {}
+    for i, pid in enumerate(pd.unique(partition_ids)):
+        r, g, b = colorsys.hsv_to_rgb((i * 0.61803) % 1, 0.35, 0.95)
+        palette[pid] = f'{int(255 * r):02X}{int(255 * g):02X}{int(255 * b):02X}'
+    return palette
 
 
 def main():
     # 1. Load Data
-    print("Loading data...")
-    df = pd.read_csv('data/adult.csv')
-    df['original_id'] = df.index
-
-    # Preprocessing
     quasi_identifiers = ['gender', 'age', 'zip', 'country', 'education', 'marital_status', 'occupation']
     sensitive = ['race', 'income']
-    qi_and_sensitive = set(quasi_identifiers + sensitive)
 
-    identifiers = [col for col in df.columns if col not in qi_and_sensitive and col != 'original_id']
-    df = df.drop(columns=identifiers)
+    # Only QIs and sensitive attributes are parsed: identifiers are never loaded
+    print("Loading data...")
+    df = pd.read_csv('data/adult.csv', usecols=quasi_identifiers + sensitive,
+                     dtype={'age': np.int16, 'zip': np.int32})
+    df['original_id'] = np.arange(len(df), dtype=np.int32)
 
     # Use subset for testing
     df_subset = df.iloc[:200].copy()
@@ -57,14 +57,21 @@ def main():
         print("\nGenerating colored Excel file...")
         output_file = 'data/anonymized_grouped.xlsx'
 
-        def highlight_partitions(row):
-            color = generate_color(row['partition_id'])
-            return [color] * len(row)
-
-        styled_df = anon_df.style.apply(highlight_partitions, axis=1)
-
         # Engine 'openpyxl' is required for writing .xlsx files
-        styled_df.to_excel(output_file, engine='openpyxl', index=False)
+        anon_df.to_excel(output_file, engine='openpyxl', index=False)
+
+        # Second pass: color cells directly, one shared Fill per partition
+        palette = build_palette(anon_df['partition_id'])
+        fills = {pid: PatternFill('solid', fgColor=color) for pid, color in palette.items()}
+
+        wb = load_workbook(output_file)
+        ws = wb.active
+        # Row 1 holds the header
+        for row, pid in zip(ws.iter_rows(min_row=2), anon_df['partition_id'].to_numpy()):
+            fill = fills[pid]
+            for cell in row:
+                cell.fill = fill
+        wb.save(output_file)
 
         print(f"Saved grouped and colored dataset to '{output_file}'")
     else:
@@ -1,9 +1,20 @@
-import copy
+import numpy as np
 import pandas as pd
+from anytree import PostOrderIter
 from .partition import Partition
 from .hierarchies import build_hierarchies
 
 
+def _mondrian_numeric_split(col, row_idx):
+    """
+    Median split over one numerical QI column of a partition.
+    Returns (left_rows, right_rows, median) with left = [low, median), right = [median, high).
+    """
+    median = int(np.median(col))
+    left = col < median
+    return row_idx[left], row_idx[~left], median
+
+
 class MondrianAnonymizer:
     def __init__(self, df, quasi_identifiers, sensitive_attributes, k=10):
         self.raw_data = df
@@ -13,6 +24,19 @@ class MondrianAnonymizer:
         self.trees = build_hierarchies()
         self.result_partitions = []
 
+        # Contiguous NumPy copy of every QI column: partitions only hold row
+        # positions into these arrays, so splits never touch the DataFrame
+        self.qi_arrays = {col: self.raw_data[col].to_numpy() for col in self.qis}
+
+        # Categorical QIs are also encoded to small integer codes, and every
+        # hierarchy node is annotated once with the codes of its leaves
+        self.qi_codes = {}
+        for col in self.qis:
+            if col in self.trees:
+                categorical = pd.Categorical(self.raw_data[col])
+                self.qi_codes[col] = categorical.codes
+                self._annotate_hierarchy(self.trees[col], categorical.categories)
+
         # Determine global ranges (min-max) for numerical attributes
         # This is needed for normalized width calculations
         self.global_ranges = {}
@@ -20,22 +44,49 @@ class MondrianAnonymizer:
             if col in self.trees:
                 self.global_ranges[col] = self.trees[col]
             else:
-                self.global_ranges[col] = f"{self.raw_data[col].min()}-{self.raw_data[col].max() + 1}"
+                low, high = int(self.raw_data[col].min()), int(self.raw_data[col].max()) + 1
+                self.global_ranges[col] = (low, high)
+
+                # Integer QIs are narrowed to the smallest dtype holding [low, high]
+                if pd.api.types.is_integer_dtype(self.raw_data[col]):
+                    self.qi_arrays[col] = self.qi_arrays[col].astype(self._narrowest_int(low, high))
+
+    @staticmethod
+    def _narrowest_int(low, high):
+        for dtype in (np.int8, np.int16, np.int32):
+            info = np.iinfo(dtype)
+            if info.min <= low and high <= info.max:
+                return dtype
+        return np.int64
+
+    @staticmethod
+    def _annotate_hierarchy(root, categories):
+        """Caches on each node its leaf names, leaf count and the codes of its leaves."""
+        # Bottom-up, so each node reuses its children's leaf names instead of
+        # walking its whole subtree again via node.leaves
+        for node in PostOrderIter(root):
+            if node.is_leaf:
+                node.leaf_names = (node.name,)
+            else:
+                node.leaf_names = tuple(name for child in node.children for name in child.leaf_names)
+            codes = categories.get_indexer(node.leaf_names)
+            # Leaves that never occur in the data have no code (-1)
+            node.leaf_codes = codes[codes >= 0].astype(np.int32)
+            node.n_leaves = len(node.leaf_names)
 
     def run(self):
         """Initializes the whole partition and starts the recursion."""
         print(f"Starting Anonymization with K={self.k}...")
 
-        # Initial allowability: All QIs are cuttable
-        allowable = {k: True for k in self.qis}
-        for s in self.sensitive:
-            allowable[s] = False
+        # Initial allowability: All QIs are cuttable (bit i <-> self.qis[i]);
+        # sensitive attributes have no bit, so they are never cut
+        allowable = (1 << len(self.qis)) - 1
 
         whole_partition = Partition(
             dimensions=self.qis,
             ranges=self.global_ranges,
-            allowable_dims=allowable,
-            members=self.raw_data,
+            allowable_mask=allowable,
+            row_idx=np.arange(len(self.raw_data), dtype=np.int32),
             iteration=0
         )
 
@@ -54,19 +105,18 @@ class MondrianAnonymizer:
         partition.widths = self._get_dimension_width(partition)
 
         # If width is 0, we can't cut it anymore
-        for dim, width in partition.widths.items():
-            if width == 0:
-                partition.allowable_dims[dim] = False
+        for dim_idx in np.flatnonzero(partition.widths == 0):
+            partition.allowable_mask &= ~(1 << int(dim_idx))
 
         # 3. Sort dimensions by width (Greedy approach)
-        # Sort descending by width
-        dimension_ranking = sorted(partition.widths.items(), key=lambda item: item[1], reverse=True)
-        possible_cuts = [dim for dim, w in dimension_ranking if partition.allowable_dims[dim]]
+        # Sort descending by width (stable: ties keep QI order)
+        dimension_ranking = np.argsort(-partition.widths, kind='stable')
+        possible_cuts = [int(i) for i in dimension_ranking if partition.allowable_mask >> int(i) & 1]
 
         # 4. Try to cut
         valid_split_found = False
-        for dim in possible_cuts:
-            sub_partitions = self._split_partition(partition, dim)
+        for dim_idx in possible_cuts:
+            sub_partitions = self._split_partition(partition, self.qis[dim_idx])
 
             # Check K-anonymity for sub-partitions
             # Criteria: All groups must be >= K, or we reject the split.
@@ -80,100 +130,98 @@ class MondrianAnonymizer:
                     self._anonymise_recursive(sp)
                 break
             else:
-                # This dimension didn't work, mark as allowable=False for this specific path
-                partition.allowable_dims[dim] = False
+                # This dimension didn't work, clear its bit for this specific path
+                partition.allowable_mask &= ~(1 << dim_idx)
 
         if not valid_split_found:
             self.result_partitions.append(partition)
 
     def _get_dimension_width(self, partition):
-        widths = {}
-        for dim in self.qis:
+        """Returns the normalized widths as an array aligned with self.qis."""
+        widths = np.zeros(len(self.qis))
+        for i, dim in enumerate(self.qis):
             if dim in self.trees:
                 # Categorical width
                 node = partition.ranges[dim]
                 root = self.trees[dim]
-                widths[dim] = len(node.leaves) / len(root.leaves) if len(root.leaves) > 0 else 0
+                widths[i] = node.n_leaves / root.n_leaves if root.n_leaves > 0 else 0
             else:
                 # Numerical width
-                curr_low, curr_high = map(int, partition.ranges[dim].split('-'))
+                curr_low, curr_high = partition.ranges[dim]
 
                 # Global range for normalization
-                glob_low, glob_high = map(int, self.global_ranges[dim].split('-'))
+                glob_low, glob_high = self.global_ranges[dim]
 
                 curr_w = curr_high - curr_low
                 glob_w = glob_high - glob_low
-                widths[dim] = curr_w / glob_w if glob_w > 0 else 0
+                widths[i] = curr_w / glob_w if glob_w > 0 else 0
         return widths
 
     def _split_partition(self, partition, dim):
+        # Children get a shallow copy of ranges and inherit the allowability mask
+        # by value: range values are treated as immutable; do not mutate a Node in place.
         sub_partitions = []
 
         if dim in self.trees:
             # Categorical Split
             current_node = partition.ranges[dim]
             for child in current_node.children:
-                new_ranges = copy.deepcopy(partition.ranges)
+                new_ranges = partition.ranges.copy()
                 new_ranges[dim] = child
 
-                # Filter members
-                descendant_leaves = [n.name for n in child.leaves]
-                # If child is a leaf itself
-                if not descendant_leaves:
-                    descendant_leaves = [child.name]
+                # Filter row positions by the child's precomputed leaf codes
+                codes = self.qi_codes[dim][partition.row_idx]
+                sub_rows = partition.row_idx[np.isin(codes, child.leaf_codes)]
 
-                # Filter dataframe
-                sub_members = partition.members[partition.members[dim].isin(descendant_leaves)]
-
-                sub_p = Partition(partition.dimensions, new_ranges, copy.deepcopy(partition.allowable_dims),
-                                  sub_members, partition.iteration + 1)
+                sub_p = Partition(partition.dimensions, new_ranges, partition.allowable_mask,
+                                  sub_rows, partition.iteration + 1)
                 sub_partitions.append(sub_p)
         else:
             # Numerical Split (Median)
-            median = int(partition.members[dim].median())
-            curr_low, curr_high = map(int, partition.ranges[dim].split('-'))
+            col = partition.column(dim, self)
+            left_rows, right_rows, median = _mondrian_numeric_split(col, partition.row_idx)
+            curr_low, curr_high = partition.ranges[dim]
 
+            # Every member already lies in [low, high), so a single comparison
+            # against the median separates the two halves:
             # Range 1: [low, median)
             # Range 2: [median, high)
-            split_ranges = [f"{curr_low}-{median}", f"{median}-{curr_high}"]
-
-            for r_str in split_ranges:
-                r_low, r_high = map(int, r_str.split('-'))
-                new_ranges = copy.deepcopy(partition.ranges)
-                new_ranges[dim] = r_str
+            split = [((curr_low, median), left_rows), ((median, curr_high), right_rows)]
 
-                # Filter members
-                sub_members = partition.members[(partition.members[dim] >= r_low) & (partition.members[dim] < r_high)]
+            for r, sub_rows in split:
+                new_ranges = partition.ranges.copy()
+                new_ranges[dim] = r
 
-                sub_p = Partition(partition.dimensions, new_ranges, copy.deepcopy(partition.allowable_dims),
-                                  sub_members, partition.iteration + 1)
+                sub_p = Partition(partition.dimensions, new_ranges, partition.allowable_mask,
+                                  sub_rows, partition.iteration + 1)
                 sub_partitions.append(sub_p)
 
         return sub_partitions
 
     def _build_anonymized_df(self):
-        anon_df = pd.DataFrame()
+        # Output columns are allocated once over all rows and filled by partition
+        n_rows = len(self.raw_data)
+        qi_out = {col: np.empty(n_rows, dtype=object) for col in self.qis}
+        partition_id_out = np.full(n_rows, -1, dtype=np.int64)
 
         # Enumerate gives us a unique integer (0, 1, 2...) for each partition
         for partition_id, p in enumerate(self.result_partitions):
-            p_df = pd.DataFrame()
-
             # 1. Fill QIs
             for col in self.qis:
                 val = p.ranges[col]
-                val_str = val.name if hasattr(val, 'name') else val
-                p_df[col] = [val_str] * len(p)
-
-            # 2. Fill Sensitive/Other Attributes
-            for col in self.raw_data.columns:
-                if col not in self.qis:
-                    p_df[col] = p.members[col].values
-
-            # 3. ADD PARTITION ID (This enables coloring)
-            p_df['partition_id'] = partition_id
-
-            # 4. Restore Index
-            p_df.index = p.members.index
-            anon_df = pd.concat([anon_df, p_df])
-
-        return anon_df.sort_index()
\ No newline at end of file
+                val_str = val.name if hasattr(val, 'name') else f"{val[0]}-{val[1]}"
+                qi_out[col][p.row_idx] = val_str
+
+            # 2. ADD PARTITION ID (This enables coloring)
+            partition_id_out[p.row_idx] = partition_id
+
+        # 3. Sensitive/Other Attributes are copied whole from the raw data
+        columns = dict(qi_out)
+        for col in self.raw_data.columns:
+            if col not in self.qis:
+                columns[col] = self.raw_data[col].array
+        columns['partition_id'] = partition_id_out
+
+        # 4. Restore Index, keeping only rows that ended up in a partition
+        anon_df = pd.DataFrame(columns, index=self.raw_data.index)
+        return anon_df[partition_id_out >= 0].sort_index()
@@ -1,19 +1,23 @@
 
 class Partition:
-    def __init__(self, dimensions, ranges, allowable_dims, members, iteration=0):
+    def __init__(self, dimensions, ranges, allowable_mask, row_idx, iteration=0):
         self.dimensions = dimensions
         self.ranges = ranges
-        self.allowable_dims = allowable_dims
-        self.members = members  # The actual DataFrame subset
+        self.allowable_mask = allowable_mask  # Bit i set <=> dimensions[i] can still be cut
+        self.row_idx = row_idx  # int32 row positions into the anonymizer's data (stored once there)
         self.iteration = iteration
-        self.widths = {}
+        self.widths = None
         self.medians = {}
 
+    def column(self, dim, anonymizer):
+        """Values of QI `dim` for this partition's rows."""
+        return anonymizer.qi_arrays[dim][self.row_idx]
+
     def __len__(self):
-        return len(self.members)
+        return len(self.row_idx)
 
     def __str__(self):
-        # Determine how to print based on whether the range is a Node (categorical) or string (numerical)
+        # Determine how to print based on whether the range is a Node (categorical) or (low, high) tuple (numerical)
         to_print = []
         for dim in self.dimensions:
             val = self.ranges[dim]
@@ -21,7 +25,7 @@ class Partition:
             if hasattr(val, 'name'):
                 to_print.append(val.name)
             else:
-                to_print.append(val)
+                to_print.append(f"{val[0]}-{val[1]}")
         return str(to_print)
 
     def __repr__(self):